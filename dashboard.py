@@ -1,4 +1,5 @@
 import dash
+import flask
 from dash import dcc, html, dash_table, Input, Output, State
 from pymongo import MongoClient
 import pandas as pd
@@ -6,6 +7,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 from config import MONGO_URI
+from export import register_export
+from summary_frame import compact_summary, stage_rows, select_rows, rat_values, table_records
+from serialization import configure_json, figure_json, COMPRESS_CONFIG, COMPRESS_AVAILABLE
 
 
 #prism color palette for line graphs
@@ -27,19 +31,21 @@ client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 collection = db[SUMMARY_COLLECTION]
 
-# Query the summary collection once
-summary_df = pd.DataFrame([day for doc in collection.find() for day in doc.get("daily_summary", [])])
-summary_df["Date"] = pd.to_datetime(summary_df["Date"])
+# Query the summary collection once into a single compact frame sorted by (Stage, RatID, Date)
+summary_df = compact_summary(pd.DataFrame([day for doc in collection.find() for day in doc.get("daily_summary", [])]))
 
-# For pages 1 & 2, remove Stage 0 from the summary data
-df = summary_df[summary_df["Stage"] != 0].copy()
+# For pages 1 & 2, remove Stage 0 from the summary data (a slice, not a copy)
+df = stage_rows(summary_df, 1, summary_df["Stage"].max())
 
 # Get unique RatIDs and Stages for pages 1 & 2
-rat_ids = df["RatID"].unique()
+rat_ids = rat_values(df)
 rat_id_options = [{"label": f"Rat {rat}", "value": rat} for rat in rat_ids]
-stages = sorted(df["Stage"].unique())
+stages = sorted(int(stage) for stage in df["Stage"].unique())
 stage_options = [{"label": f"Stage {stage}", "value": stage} for stage in stages]
 
+# Rows sent to the Data Overview table per page
+TABLE_PAGE_SIZE = 10
+
 # Define metric options for pages 1 & 2
 all_metrics = {
     "FP_total": "Total False Positives",
@@ -67,10 +73,10 @@ phase_1_metrics = {
 }
 
 # For the Recap page, use the full summary_df (which includes stage 0)
-progress_df = summary_df.copy()
-progress_rat_ids = progress_df["RatID"].unique()
+progress_df = summary_df
+progress_rat_ids = rat_values(progress_df)
 progress_rat_id_options = [{"label": f"Rat {rat}", "value": rat} for rat in progress_rat_ids]
-progress_stages = sorted(progress_df["Stage"].unique())
+progress_stages = sorted(int(stage) for stage in progress_df["Stage"].unique())
 progress_stage_options = [{"label": f"Stage {stage}", "value": stage} for stage in progress_stages]
 
 # -----------------------------
@@ -148,8 +154,11 @@ page_1_layout = html.Div([
         dash_table.DataTable(
             id="data-table",
             columns=[{"name": col, "id": col} for col in df.columns],
-            data=df.to_dict("records"),
-            page_size=10,
+            # Paged on the server so the layout holds one page of rows instead of the whole frame
+            page_action="custom",
+            page_current=0,
+            page_size=TABLE_PAGE_SIZE,
+            page_count=max(1, -(-len(df) // TABLE_PAGE_SIZE)),
             style_table={"overflowX": "auto"},
             style_header={"fontWeight": "bold", "backgroundColor": "rgb(29, 105, 150)", "color": "white"},
             style_cell={"textAlign": "center", "padding": "10px", "backgroundColor": "white", "color": "#333", "border": "1px solid rgb(29, 105, 150)"},
@@ -285,8 +294,15 @@ page_3_layout = html.Div([
 # -----------------------------
 # App Layout and Page Routing
 # -----------------------------
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
+# Serialize responses with orjson and gzip/brotli compress them
+configure_json()
+server = flask.Flask(__name__)
+server.config.update(COMPRESS_CONFIG)
+app = dash.Dash(__name__, server=server, compress=COMPRESS_AVAILABLE,
+                external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
 app._favicon = "favicon.png"
+# Streaming CSV/Parquet downloads at /export/raw and /export/summaries
+register_export(app.server, db)
 app.layout = html.Div([
     dcc.Location(id="url", refresh=False),
     navbar_component,  # Include the navbar component here
@@ -336,6 +352,15 @@ def display_page(pathname):
 # -----------------------------
 # Callbacks for Page 1
 # -----------------------------
+@app.callback(
+    Output("data-table", "data"),
+    Input("data-table", "page_current"),
+    Input("data-table", "page_size")
+)
+def update_table_page(page_current, page_size):
+    start = (page_current or 0) * page_size
+    return table_records(df.iloc[start:start + page_size])
+
 @app.callback(
     Output("metric-dropdown", "options"),
     Output("metric-dropdown", "value"),
@@ -358,13 +383,10 @@ def update_metric_options(selected_stage):
     Input("time-range", "value")
 )
 def update_line_graph(selected_rats, selected_stage, selected_metric, time_range):
-    if "all" in selected_rats:
-        filtered_df = df[df["Stage"] == selected_stage]
-    else:
-        filtered_df = df[(df["Stage"] == selected_stage) & (df["RatID"].isin(selected_rats))]
+    filtered_df = select_rows(df, selected_stage, selected_rats)
     
     filtered_df = filtered_df.sort_values(by=["RatID", "Date"], ascending=[True, False])
-    filtered_df = filtered_df.groupby("RatID").head(time_range)
+    filtered_df = filtered_df.groupby("RatID", observed=True).head(time_range)
   #fetching label to be more readable, not exact name in table
     metric_label = all_metrics[selected_metric]
 
@@ -390,7 +412,7 @@ def update_line_graph(selected_rats, selected_stage, selected_metric, time_range
         yaxis=dict(showgrid=False, zeroline=False, color="#333"),
         colorway= prism
     )
-    return fig
+    return figure_json(fig)
 
 # -----------------------------
 # Callback for Page 2
@@ -402,10 +424,7 @@ def update_line_graph(selected_rats, selected_stage, selected_metric, time_range
     Input("averages-ratid-dropdown", "value")
 )
 def update_averages_display(selected_stage, selected_metric, selected_rat_ids):
-    if "all" in selected_rat_ids:
-        filtered_df = df[df["Stage"] == selected_stage]
-    else:
-        filtered_df = df[(df["Stage"] == selected_stage) & (df["RatID"].isin(selected_rat_ids))]
+    filtered_df = select_rows(df, selected_stage, selected_rat_ids)
 
     if len(selected_rat_ids) == 1 and selected_rat_ids[0] != "all":
         if not filtered_df.empty:
@@ -429,7 +448,7 @@ def update_averages_display(selected_stage, selected_metric, selected_rat_ids):
             yaxis=dict(showgrid=False, zeroline=False, color="#333"),
             colorway= prism
         )
-        return dcc.Graph(figure=gauge_fig, style={"width": "50%", "margin": "auto"})
+        return dcc.Graph(figure=figure_json(gauge_fig), style={"width": "50%", "margin": "auto"})
     else:
         if not filtered_df.empty:
             aggregated_avg = filtered_df[selected_metric].mean()
@@ -452,7 +471,7 @@ def update_averages_display(selected_stage, selected_metric, selected_rat_ids):
             yaxis=dict(showgrid=False, zeroline=False, color="#333"),
             colorway= prism
         )
-        return dcc.Graph(figure=gauge_fig, style={"width": "50%", "margin": "auto"})
+        return dcc.Graph(figure=figure_json(gauge_fig), style={"width": "50%", "margin": "auto"})
 
 # -----------------------------
 # Callback for Page 3 (Recap)
@@ -463,12 +482,10 @@ def update_averages_display(selected_stage, selected_metric, selected_rat_ids):
     Input("progress-ratid-dropdown", "value")
 )
 def update_progress_display(selected_stage, selected_rat_ids):
-    filtered = progress_df[progress_df["Stage"] == selected_stage]
-    if "all" not in selected_rat_ids:
-        filtered = filtered[filtered["RatID"].isin(selected_rat_ids)]
+    filtered = select_rows(progress_df, selected_stage, selected_rat_ids)
     
     profile_cards = []
-    for rat, group in filtered.groupby("RatID"):
+    for rat, group in filtered.groupby("RatID", observed=True):
         group = group.sort_values("Date")
         days_in_stage = group["Date"].nunique()
         most_recent = group.iloc[-1]
@@ -0,0 +1,246 @@
+from flask import Response, request, stream_with_context
+from datetime import datetime
+import argparse
+import itertools
+import time
+import zlib
+import io
+import pandas as pd
+from storage import raw_pipeline, RAW_COLLECTION, SUMMARY_COLLECTION, STRING_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_BATCH_SIZE = 100000
+
+# Fields written for each dataset. Fixing them up front keeps the header/schema
+# stable across batches, since stage 0 trials are missing the match columns.
+META_FIELDS = ["Date", "RatID", "Stage", "Session"]
+RAW_FIELDS = META_FIELDS + [
+    "Trial num", "HH time", "Latency to corr sample", "Latency to corr match",
+    "Corr sample port num", "Trial type", "Target odor num", "Target odor name",
+    "Target odor concentration", "Num pokes corr sample", "Time in corr sample",
+    "Time in corr port after reward", "Inc sample port num", "Num pokes inc sample",
+    "Time in inc sample", "False pos inc sample", "Corr match port num", "Corr match odor num",
+    "Corr match odor name", "Match odor concentration", "Num pokes corr match", "Time in corr match",
+    "Inc match 1 port num", "Inc match 1 odor num", "Inc match 1 odor name", "Num pokes inc match 1",
+    "Time in inc match 1", "False pos inc match 1", "Inc match 2 port num", "Inc match 2 odor num",
+    "Inc match 2 odor name", "Num pokes inc match 2", "Time in inc match 2", "False pos inc match 2",
+    "TP", "FP", "S_FP", "M_FP", "Timeout", "Max_HH", "trial_completed"
+]
+SUMMARY_FIELDS = ["Date", "RatID", "Stage"] + [
+    "TP_total", "FP_total", "S_FP_total", "M_FP_total", "Latency to corr sample_avg",
+    "Latency to corr match_avg", "Num pokes corr sample_avg", "Time in corr sample_avg",
+    "Num pokes inc sample_avg", "Time in inc sample_avg", "Num pokes corr match_avg",
+    "Time in corr match_avg", "Max_HH", "trials_completed"
+]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+# -----------------------------
+# Query Building
+# -----------------------------
+def build_filter(args):
+    """Turn ?rat=1&rat=7&stage=2&start=2025-03-01&end=2025-03-31 into a Mongo filter."""
+    query = {}
+    rats = [int(r) for r in args.getlist("rat")]
+    stages = [int(s) for s in args.getlist("stage")]
+    if rats:
+        query["RatID"] = {"$in": rats}
+    if stages:
+        query["Stage"] = {"$in": stages}
+    date_range = {}
+    if args.get("start"):
+        date_range["$gte"] = datetime.fromisoformat(args["start"])
+    if args.get("end"):
+        date_range["$lte"] = datetime.fromisoformat(args["end"])
+    if date_range:
+        query["Date"] = date_range
+    return query
+
+
+def open_cursor(db, dataset, query, batch_size):
+    if dataset == "raw":
+        # raw_pipeline flattens time-series documents back into one row per trial
+        pipeline = raw_pipeline(db, query) + [{"$project": {"_id": 0, **{field: 1 for field in RAW_FIELDS}}}]
+        return db[RAW_COLLECTION].aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+    # Summaries are stored as arrays per upload, so unwind them server side. The
+    # $elemMatch first lets the daily_summary index skip uploads with no matching days.
+    pipeline = [
+        {"$match": {"daily_summary": {"$elemMatch": query}} if query else {}},
+        {"$unwind": "$daily_summary"},
+        {"$replaceRoot": {"newRoot": "$daily_summary"}},
+        {"$match": query},
+        {"$project": {"_id": 0, **{field: 1 for field in SUMMARY_FIELDS}}},
+    ]
+    return db[SUMMARY_COLLECTION].aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+
+
+def iter_batches(cursor, fields, batch_size):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch, columns=fields)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=fields)
+
+
+# -----------------------------
+# Chunked Writers
+# -----------------------------
+def stream_csv(batches, fields, compress=False):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 writes a gzip header
+    header = True
+    # An empty result still gets its header row
+    for df in itertools.chain(batches, [pd.DataFrame(columns=fields)]):
+        if not header and df.empty:
+            continue
+        chunk = df.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+class ChunkSink(io.RawIOBase):
+    """File-like object that collects what ParquetWriter writes so it can be yielded."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema(fields):
+    types = []
+    for field in fields:
+        if field == "Date":
+            types.append(pa.field(field, pa.timestamp("ms")))
+        elif field in ("RatID", "Stage", "Session"):
+            types.append(pa.field(field, pa.int64()))
+        elif field in STRING_COLUMNS:
+            types.append(pa.field(field, pa.string()))
+        else:
+            types.append(pa.field(field, pa.float64()))
+    return pa.schema(types)
+
+
+def stream_parquet(batches, fields):
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for df in batches:
+        # Each batch becomes a row group, written out as soon as it is ready
+        writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(db, dataset, query, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    fields = RAW_FIELDS if dataset == "raw" else SUMMARY_FIELDS
+    batches = iter_batches(open_cursor(db, dataset, query, batch_size), fields, batch_size)
+    if fmt == "parquet":
+        return stream_parquet(batches, fields)
+    return stream_csv(batches, fields, compress=(fmt == "csv.gz"))
+
+
+# -----------------------------
+# Flask Route
+# -----------------------------
+def register_export(server, db):
+    """Add /export/raw and /export/summaries to the Dash app's Flask server."""
+
+    @server.route("/export/<dataset>")
+    def export(dataset):
+        if dataset not in ("raw", "summaries"):
+            return Response(f"Unknown dataset: {dataset}", status=404)
+        fmt = request.args.get("format", "csv")
+        if fmt not in FORMATS or (fmt == "parquet" and pa is None):
+            return Response(f"Unsupported format: {fmt}", status=400)
+        try:
+            query = build_filter(request.args)
+            batch_size = max(1, min(int(request.args.get("batch_size", DEFAULT_BATCH_SIZE)), MAX_BATCH_SIZE))
+        except ValueError as e:
+            return Response(f"Bad export parameters: {e}", status=400)
+
+        mimetype, extension = FORMATS[fmt]
+        return Response(
+            stream_with_context(export_stream(db, dataset, query, fmt, batch_size)),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={dataset}.{extension}"}
+        )
+
+    return export
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def benchmark(db, dataset="raw", fmt="csv", batch_size=DEFAULT_BATCH_SIZE, query=None):
+    """Stream an export to nowhere and report rows/sec and peak RSS."""
+    query = query or {}
+    fields = RAW_FIELDS if dataset == "raw" else SUMMARY_FIELDS
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for df in batches:
+            rows += len(df)
+            yield df
+
+    import resource  # Unix only, so not imported when the dashboard loads this module
+
+    start = time.perf_counter()
+    batches = counted(iter_batches(open_cursor(db, dataset, query, batch_size), fields, batch_size))
+    stream = stream_parquet(batches, fields) if fmt == "parquet" else stream_csv(batches, fields, fmt == "csv.gz")
+    total_bytes = sum(len(chunk) for chunk in stream)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{dataset} as {fmt} (batch {batch_size}): {rows} rows in {elapsed:.1f}s, "
+          f"{rows / elapsed:.0f} rows/s, {total_bytes / 1024 ** 2:.1f} MB out, peak RSS {peak_rss:.0f} MB")
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from config import MONGO_URI
+
+    parser = argparse.ArgumentParser(description="Benchmark the streaming export.")
+    parser.add_argument("--dataset", choices=["raw", "summaries"], default="raw")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    benchmark(MongoClient(MONGO_URI)["training_data"], args.dataset, args.format, args.batch_size)
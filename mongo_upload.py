@@ -5,14 +5,39 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import time
 import chardet  # Added for encoding detection
+import argparse
+import hashlib
+import json
+import re
 from collections import Counter
 import pandas as pd
 from config import MONGO_URI
+from storage import ensure_layout, insert_trials, INTEGER_COLUMNS, FLOAT_COLUMNS, STRING_COLUMNS
+
+# calamine parses workbooks far faster than openpyxl, fall back if it isn't installed
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # let pandas pick openpyxl/xlrd by extension
+
+# Converted workbooks are cached as Parquet when pyarrow is available, otherwise CSV
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = "parquet"
+except ImportError:
+    CACHE_FORMAT = "csv"
 
 DB_NAME = "training_data"
 COLLECTION_NAME = "Raw_Data"
 SUMMARY_COLLECTION_NAME = "Daily summaries"
 folder_location = r"C:\Users\obrie\OneDrive\Desktop\Documents\Local_Python\Williams Data Science Project\DBs"
+cache_location = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_cache")
+catalog_path = os.path.join(cache_location, "catalog.json")
+# Files dated before this only produce empty uploads, so they are never opened
+CUTOFF_DATE = datetime(2024, 8, 1)
+# Bump when the column schema changes so old conversions are not reused
+CACHE_VERSION = 2
 
 # Connect to MongoDB
 try:
@@ -21,21 +46,23 @@ try:
     collection = db[COLLECTION_NAME]
     summary_collection = db[SUMMARY_COLLECTION_NAME]
     print("Connected to MongoDB.")
+    # Creates Raw_Data as a time-series collection on first run and keeps indexes in place
+    ensure_layout(db)
 except Exception as e:
     print(f"Failed to connect to MongoDB: {e}")
     exit(1)
 
 
 # Parse filename metadata
+# e.g. metrics_rat1_stage2_session10_10_30_2023_10_45_1.csv
+FILENAME_PATTERN = re.compile(r"^metrics_rat(\d+)_stage(\d+)_session(\d+)_(\d+)_(\d+)_(\d+)")
+
+
 def parse_filename(filename):
-    parts = filename.split("_")
-    dates = parts[4:7]
-    month, day = int(dates[0]), int(dates[1])
-    year = int(dates[2].split(".")[0])
-    # Removed condition to always assign a rat_id
-    rat_id = int(parts[1][3:])
-    session = int(parts[3][7:])
-    stage = int(parts[2][5:])
+    match = FILENAME_PATTERN.match(filename)
+    if match is None:
+        raise ValueError(f"Unrecognized filename: {filename}")
+    rat_id, stage, session, month, day, year = map(int, match.groups())
     return [rat_id, session, stage, month, day, year]
 
 
@@ -48,15 +75,92 @@ def detect_encoding(file_path, num_bytes=10000):
     return result["encoding"]
 
 
+# Same column types for every metrics file so CSV and Excel produce identical records.
+# Cells that are not numbers become empty instead of failing the whole file.
+def apply_schema(df, file_path=""):
+    for col in INTEGER_COLUMNS + FLOAT_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        bad = int((values.isna() & df[col].notna()).sum())
+        if bad:
+            print(f"{file_path}: {bad} non-numeric value(s) in '{col}' left empty.")
+        # Counts, ports and odor numbers stay integers (as in older Raw_Data documents) unless they have gaps
+        if col in INTEGER_COLUMNS and values.notna().all() and (values % 1 == 0).all():
+            values = pd.to_numeric(values, downcast="integer")
+        elif col in FLOAT_COLUMNS:
+            values = values.astype("float64")
+        df[col] = values
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
+    return df
+
+
+def file_digest(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def read_cached_sheet(path):
+    if CACHE_FORMAT == "parquet":
+        return apply_schema(pd.read_parquet(path))
+    return apply_schema(pd.read_csv(path))
+
+
+def write_cached_sheet(df, path):
+    tmp_path = path + ".tmp"
+    if CACHE_FORMAT == "parquet":
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# Parse a workbook once, one sheet at a time, into the content-hashed cache
+def convert_excel(file_path, digest):
+    sheet_paths = []
+    with pd.ExcelFile(file_path, engine=EXCEL_ENGINE) as workbook:
+        for i, sheet_name in enumerate(workbook.sheet_names):
+            df = apply_schema(workbook.parse(sheet_name), file_path)
+            sheet_path = os.path.join(cache_location, f"{digest}_{i}.{CACHE_FORMAT}")
+            write_cached_sheet(df, sheet_path)
+            sheet_paths.append(sheet_path)
+            del df  # only keep one sheet in memory at a time
+    # The manifest is written last so a crash mid-conversion is redone on the next run
+    manifest = {"source": os.path.basename(file_path), "sheets": workbook.sheet_names, "paths": sheet_paths}
+    manifest_path = os.path.join(cache_location, f"{digest}.json")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def load_excel(file_path, sheet=0):
+    os.makedirs(cache_location, exist_ok=True)
+    digest = f"{file_digest(file_path)}_v{CACHE_VERSION}"
+    manifest_path = os.path.join(cache_location, f"{digest}.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = convert_excel(file_path, digest)
+    index = sheet if isinstance(sheet, int) else manifest["sheets"].index(sheet)
+    return read_cached_sheet(manifest["paths"][index])
+
+
 # Load data dynamically (CSV or Excel)
 def load_data(file_path):
     file_ext = os.path.splitext(file_path)[1].lower()
     try:
         if file_ext == ".csv":
             encoding = detect_encoding(file_path)  
-            df = pd.read_csv(file_path, encoding=encoding)
+            df = apply_schema(pd.read_csv(file_path, encoding=encoding), file_path)
         elif file_ext in [".xls", ".xlsx"]:
-            df = pd.read_excel(file_path, engine="openpyxl")
+            df = load_excel(file_path)
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
     except Exception as e:
@@ -67,16 +171,15 @@ def load_data(file_path):
 
 # Convert DataFrame to dictionary format for MongoDB
 def make_dict(file_path):
-    df = load_data(file_path)
-    if df is None:
-        return []
-
     metadata = parse_filename(os.path.basename(file_path))
     file_date = datetime(metadata[5], metadata[3], metadata[4])
-    cutoff_date = datetime(2024, 1, 8)
-    # Only process files later than the cutoff date
-    if file_date < cutoff_date:
-        print(f"Skipping file {file_path} as its date {file_date.date()} is before cutoff {cutoff_date.date()}.")
+    # Only process files later than the cutoff date, checked before the file is read
+    if file_date < CUTOFF_DATE:
+        print(f"Skipping file {file_path} as its date {file_date.date()} is before cutoff {CUTOFF_DATE.date()}.")
+        return []
+
+    df = load_data(file_path)
+    if df is None:
         return []
 
     # Assign metadata to the dataframe
@@ -85,8 +188,6 @@ def make_dict(file_path):
     df["Stage"] = metadata[2]
     df["Date"] = file_date
 
-    # Only include files after August 1, 2024
-    df = df[df["Date"] >= datetime(2024, 8, 1)]
     data_dict = df.to_dict(orient="records")
 
     # Process each record in the file
@@ -203,20 +304,93 @@ def add_summary(data_dict):
     return {"daily_summary": daily_avg.to_dict(orient="records")}
 
 
+# -----------------------------
+# File catalog
+# -----------------------------
+# Indexes every metrics file in the folder by RatID/Stage/Session/Date from its name
+# alone, so selections are made without opening any files. Saved between runs and
+# only new or modified files are parsed on refresh.
+def load_catalog():
+    if not os.path.exists(catalog_path):
+        return {}
+    with open(catalog_path) as f:
+        return json.load(f)
+
+
+def save_catalog(catalog):
+    os.makedirs(cache_location, exist_ok=True)
+    with open(catalog_path + ".tmp", "w") as f:
+        json.dump(catalog, f)
+    os.replace(catalog_path + ".tmp", catalog_path)
+
+
+def catalog_entry(file_name, mtime):
+    rat_id, session, stage, month, day, year = parse_filename(file_name)
+    return {
+        "RatID": rat_id, "Stage": stage, "Session": session,
+        "Date": datetime(year, month, day).date().isoformat(), "mtime": mtime
+    }
+
+
+def refresh_catalog(folder_location):
+    catalog = load_catalog()
+    entries = {}
+    for entry in os.scandir(folder_location):
+        if not entry.is_file() or not entry.name.startswith("metrics"):
+            continue
+        mtime = entry.stat().st_mtime
+        cached = catalog.get(entry.name)
+        if cached and cached["mtime"] == mtime:
+            entries[entry.name] = cached
+            continue
+        try:
+            entries[entry.name] = catalog_entry(entry.name, mtime)
+        except ValueError as e:
+            print(e)
+    save_catalog(entries)
+    return entries
+
+
+def add_to_catalog(file_path):
+    """Record a file uploaded by the watcher so later selections and refreshes know about it."""
+    file_name = os.path.basename(file_path)
+    catalog = load_catalog()
+    catalog[file_name] = catalog_entry(file_name, os.path.getmtime(file_path))
+    save_catalog(catalog)
+
+
+def select_files(catalog, rats=None, stages=None, start=None, end=None):
+    """Return catalog filenames matching the selection, oldest first."""
+    if start and start < CUTOFF_DATE:
+        print(f"Files before {CUTOFF_DATE:%Y-%m-%d} are never uploaded, starting from {CUTOFF_DATE:%Y-%m-%d} instead of {start:%Y-%m-%d}.")
+    start = max(start, CUTOFF_DATE) if start else CUTOFF_DATE
+    selected = []
+    for file_name, info in catalog.items():
+        file_date = datetime.fromisoformat(info["Date"])
+        if file_date < start or (end and file_date > end):
+            continue
+        if rats and info["RatID"] not in rats:
+            continue
+        if stages and info["Stage"] not in stages:
+            continue
+        selected.append(file_name)
+    return sorted(selected, key=lambda name: (catalog[name]["Date"], catalog[name]["RatID"], catalog[name]["Session"]))
+
+
 # Upload files to MongoDB
-def upload(folder_location):
-    for file_name in os.listdir(folder_location):
-        if file_name.startswith("metrics"):
-            file_path = os.path.join(folder_location, file_name)
-            data_dict = make_dict(file_path)
-            summary = add_summary(data_dict)
+def upload(folder_location, rats=None, stages=None, start=None, end=None):
+    catalog = refresh_catalog(folder_location)
+    for file_name in select_files(catalog, rats, stages, start, end):
+        file_path = os.path.join(folder_location, file_name)
+        data_dict = make_dict(file_path)
+        summary = add_summary(data_dict)
 
-            if data_dict:
-                collection.insert_many(data_dict)
-            if summary:
-                summary_collection.insert_one(summary)
+        if data_dict:
+            insert_trials(db, data_dict)
+        if summary:
+            summary_collection.insert_one(summary)
 
-            print(f"Uploaded {file_name}")
+        print(f"Uploaded {file_name}")
 
 
 # Upload single file
@@ -227,9 +401,13 @@ def upload_new_file(file_name):
         summary = add_summary(data_dict)
 
         if data_dict:
-            collection.insert_many(data_dict)
+            insert_trials(db, data_dict)
         if summary:
             summary_collection.insert_one(summary)
+        try:
+            add_to_catalog(file_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not add {file_name} to the catalog: {e}")
 
         print(f"Uploaded: {file_name}")
 
@@ -257,5 +435,15 @@ def watch_and_upload():
     observer.join()
 
 
-upload(folder_location)
-watch_and_upload()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload metrics files to MongoDB and watch for new ones.")
+    parser.add_argument("--rat", type=int, nargs="+", help="Only upload these RatIDs")
+    parser.add_argument("--stage", type=int, nargs="+", help="Only upload these stages")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="First file date, e.g. 2025-03-01")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Last file date, e.g. 2025-03-31")
+    parser.add_argument("--backfill", action="store_true", help="Upload the selection and exit without watching")
+    args = parser.parse_args()
+
+    upload(folder_location, rats=args.rat, stages=args.stage, start=args.start, end=args.end)
+    if not args.backfill:
+        watch_and_upload()
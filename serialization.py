@@ -0,0 +1,115 @@
+import argparse
+import base64
+import gzip
+import time
+import numpy as np
+import plotly.io as pio
+import plotly.express as px
+from plotly.io.json import to_json_plotly
+
+try:
+    import orjson  # noqa: F401
+    JSON_ENGINE = "orjson"
+except ImportError:
+    JSON_ENGINE = "json"
+
+try:
+    import flask_compress  # noqa: F401
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Send numeric trace data as base64 typed arrays (plotly.js >= 2.28) instead of JSON lists
+TYPED_ARRAYS = True
+
+# flask-compress settings for the Dash server. Streams are left alone so /export
+# downloads are not buffered, and csv.gz/parquet exports are already compressed.
+COMPRESS_CONFIG = {
+    "COMPRESS_ALGORITHM": ["br", "gzip"],
+    "COMPRESS_BR_LEVEL": 4,
+    "COMPRESS_LEVEL": 6,
+    "COMPRESS_MIN_SIZE": 500,
+    "COMPRESS_STREAMS": False,
+}
+
+TYPED_ARRAY_CODES = {
+    "int8": "i1", "uint8": "u1", "int16": "i2", "uint16": "u2",
+    "int32": "i4", "uint32": "u4", "float32": "f4", "float64": "f8",
+}
+TYPED_ARRAY_DTYPES = {code: dtype for dtype, code in TYPED_ARRAY_CODES.items()}
+
+
+def configure_json():
+    """Make Dash serialize callback responses with orjson when it is installed."""
+    pio.json.config.default_engine = JSON_ENGINE
+
+
+# -----------------------------
+# Typed Array Encoding
+# -----------------------------
+def encode_array(value):
+    if not isinstance(value, np.ndarray) or value.ndim != 1 or value.dtype.kind not in "iuf":
+        return value
+    # plotly.js has no 64-bit integer arrays
+    if value.dtype.kind in "iu" and value.dtype.itemsize == 8:
+        fits = value.size == 0 or (value.min() >= np.iinfo(np.int32).min and value.max() <= np.iinfo(np.int32).max)
+        value = value.astype("int32" if fits else "float64")
+    value = value.astype(value.dtype.newbyteorder("<"), copy=False)
+    return {"dtype": TYPED_ARRAY_CODES[value.dtype.name], "bdata": base64.b64encode(value.tobytes()).decode("ascii")}
+
+
+def decode_array(value):
+    if not isinstance(value, dict) or "bdata" not in value or value.get("dtype") not in TYPED_ARRAY_DTYPES:
+        return value
+    dtype = np.dtype(TYPED_ARRAY_DTYPES[value["dtype"]]).newbyteorder("<")
+    return np.frombuffer(base64.b64decode(value["bdata"]), dtype=dtype).tolist()
+
+
+def figure_json(fig, typed_arrays=TYPED_ARRAYS):
+    """Return a figure as a plain dict with trace arrays encoded the way TYPED_ARRAYS asks."""
+    figure = fig.to_plotly_json()
+    convert = encode_array if typed_arrays else decode_array
+    for trace in figure["data"]:
+        for key, value in trace.items():
+            trace[key] = convert(value)
+    return figure
+
+
+# -----------------------------
+# Size and Speed Benchmark
+# -----------------------------
+def measure(name, obj, repeats):
+    timings = {}
+    for engine in ("json", "orjson"):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            payload = to_json_plotly(obj, engine=engine)
+        timings[engine] = (time.perf_counter() - start) / repeats * 1000
+    raw = payload.encode("utf-8")
+    sizes = f"raw {len(raw) / 1024:.0f} KB, gzip {len(gzip.compress(raw, 6)) / 1024:.0f} KB"
+    if brotli:
+        sizes += f", br {len(brotli.compress(raw, quality=4)) / 1024:.0f} KB"
+    print(f"{name}: json {timings['json']:.1f} ms, orjson {timings['orjson']:.1f} ms | {sizes}")
+
+
+def benchmark(num_rows=50_000, repeats=5):
+    from summary_frame import compact_summary, synthetic_summaries, table_records
+
+    frame = compact_summary(synthetic_summaries(num_rows, num_rats=10))
+    fig = px.line(frame, x="Date", y="Latency to corr sample_avg", color="RatID", markers=True)
+    print(f"{num_rows} summary rows")
+    measure("figure, JSON lists", figure_json(fig, typed_arrays=False), repeats)
+    measure("figure, typed arrays", figure_json(fig, typed_arrays=True), repeats)
+    measure("table records", table_records(frame), repeats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure callback response size and serialization time.")
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+    benchmark(args.rows)
@@ -0,0 +1,301 @@
+from pymongo.errors import CollectionInvalid, OperationFailure
+from datetime import datetime, timedelta
+import argparse
+import time
+import os
+import numpy as np
+
+RAW_COLLECTION = "Raw_Data"
+SUMMARY_COLLECTION = "Daily summaries"
+archive_location = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_cache", "archive")
+
+# Layout used when Raw_Data is first created. Time-series collections need MongoDB 5.0+,
+# older servers fall back to one flat document per trial.
+RAW_LAYOUT = "timeseries"
+META_FIELDS = ["RatID", "Stage", "Session"]
+
+# Columns of a rig metrics file, shared by the ingest schema and the exports
+INTEGER_COLUMNS = [
+    "Trial num", "Corr sample port num", "Target odor num", "Num pokes corr sample",
+    "Inc sample port num", "Num pokes inc sample", "False pos inc sample",
+    "Corr match port num", "Corr match odor num", "Num pokes corr match",
+    "Inc match 1 port num", "Inc match 1 odor num", "Num pokes inc match 1", "False pos inc match 1",
+    "Inc match 2 port num", "Inc match 2 odor num", "Num pokes inc match 2", "False pos inc match 2"
+]
+FLOAT_COLUMNS = [
+    "HH time", "Latency to corr sample", "Latency to corr match", "Target odor concentration",
+    "Time in corr sample", "Time in corr port after reward", "Time in inc sample",
+    "Match odor concentration", "Time in corr match", "Time in inc match 1", "Time in inc match 2"
+]
+STRING_COLUMNS = [
+    "Trial type", "Target odor name", "Corr match odor name",
+    "Inc match 1 odor name", "Inc match 2 odor name"
+]
+
+# Indexes matching the dashboard/export access pattern: one stage, some rats, a date range
+FLAT_INDEXES = [
+    [("RatID", 1), ("Stage", 1), ("Date", 1)],
+    [("Stage", 1), ("Date", 1)],
+]
+TIMESERIES_INDEXES = [
+    [("meta.RatID", 1), ("meta.Stage", 1), ("Date", 1)],
+    [("meta.Stage", 1), ("Date", 1)],
+]
+SUMMARY_INDEXES = [
+    [("daily_summary.Stage", 1), ("daily_summary.RatID", 1), ("daily_summary.Date", 1)],
+]
+
+# Deletes on a time-series collection filtered by Date need MongoDB 7.0+
+TIMESERIES_DELETE_VERSION = (7, 0)
+
+
+# -----------------------------
+# Layout Management
+# -----------------------------
+def raw_layout(db):
+    """Return "timeseries" or "flat" for the Raw_Data collection in this database.
+
+    Looked up on every insert and query rather than cached, so a --migrate run in
+    another process is picked up by the dashboard and the watcher straight away.
+    """
+    info = next(db.list_collections(filter={"name": RAW_COLLECTION}), None)
+    return "timeseries" if info and info.get("type") == "timeseries" else "flat"
+
+
+def create_raw_collection(db, layout=RAW_LAYOUT, name=RAW_COLLECTION):
+    if layout == "timeseries":
+        try:
+            db.create_collection(name, timeseries={"timeField": "Date", "metaField": "meta", "granularity": "hours"})
+            return "timeseries"
+        except OperationFailure as e:
+            print(f"Time-series collections not supported ({e}), using flat documents.")
+    db.create_collection(name)
+    return "flat"
+
+
+def ensure_layout(db, layout=RAW_LAYOUT):
+    """Create Raw_Data if needed and make sure both collections carry their indexes."""
+    if RAW_COLLECTION not in db.list_collection_names():
+        try:
+            create_raw_collection(db, layout)
+        except CollectionInvalid:
+            pass  # created by another process in the meantime
+
+    indexes = TIMESERIES_INDEXES if raw_layout(db) == "timeseries" else FLAT_INDEXES
+    for keys in indexes:
+        db[RAW_COLLECTION].create_index(keys)
+    for keys in SUMMARY_INDEXES:
+        db[SUMMARY_COLLECTION].create_index(keys)
+    print(f"{RAW_COLLECTION} layout: {raw_layout(db)}")
+
+
+def migrate_to_timeseries(db, batch_size=10000):
+    """Move an existing flat Raw_Data into a new time-series Raw_Data, keeping the old one as Raw_Data_flat.
+
+    Stop the upload watcher first: a trial inserted between the rename and the
+    creation of the new collection would recreate a flat Raw_Data and fail the migration.
+    """
+    if raw_layout(db) == "timeseries":
+        return
+    flat_name = f"{RAW_COLLECTION}_flat"
+    db[RAW_COLLECTION].rename(flat_name)
+    if create_raw_collection(db, "timeseries") != "timeseries":
+        db.drop_collection(RAW_COLLECTION)
+        db[flat_name].rename(RAW_COLLECTION)
+        return
+
+    batch, copied = [], 0
+    for doc in db[flat_name].find({}, {"_id": 0}, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            copied += insert_trials(db, batch)
+            batch = []
+    if batch:
+        copied += insert_trials(db, batch)
+    ensure_layout(db)
+    print(f"Copied {copied} trials into time-series {RAW_COLLECTION}; old data kept in {flat_name}.")
+
+
+# -----------------------------
+# Reading and Writing Trials
+# -----------------------------
+def to_documents(db, records):
+    if raw_layout(db) == "flat":
+        return records
+    documents = []
+    for record in records:
+        doc = {key: value for key, value in record.items() if key not in META_FIELDS}
+        doc["meta"] = {field: record[field] for field in META_FIELDS if field in record}
+        documents.append(doc)
+    return documents
+
+
+def insert_trials(db, records):
+    if not records:
+        return 0
+    db[RAW_COLLECTION].insert_many(to_documents(db, records), ordered=False)
+    return len(records)
+
+
+def raw_pipeline(db, query):
+    """Aggregation stages that filter Raw_Data and return flat trial documents for either layout."""
+    if raw_layout(db) == "flat":
+        return [{"$match": query}]
+    meta_query = {(f"meta.{key}" if key in META_FIELDS else key): value for key, value in query.items()}
+    return [
+        {"$match": meta_query},
+        {"$addFields": {field: f"$meta.{field}" for field in META_FIELDS}},
+        {"$project": {"meta": 0}},
+    ]
+
+
+# -----------------------------
+# Archival
+# -----------------------------
+def next_month(month):
+    return datetime(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def month_starts(first, last):
+    month = datetime(first.year, first.month, 1)
+    while month < last:
+        yield month
+        month = next_month(month)
+
+
+def can_delete_by_date(db):
+    if raw_layout(db) == "flat":
+        return True
+    return tuple(db.client.server_info()["versionArray"][:2]) >= TIMESERIES_DELETE_VERSION
+
+
+def archive_before(db, cutoff, delete=True, batch_size=10000):
+    """Write trials older than cutoff to monthly Parquet files in the archive, then drop them from Mongo."""
+    from export import RAW_FIELDS, iter_batches, stream_parquet
+
+    if delete and not can_delete_by_date(db):
+        # Exporting anyway would write the same months again on every rerun
+        print(f"This MongoDB cannot delete time-series trials by date (needs "
+              f"{'.'.join(map(str, TIMESERIES_DELETE_VERSION))}+); use --keep to archive without deleting.")
+        return
+    oldest = next(db[RAW_COLLECTION].aggregate([{"$sort": {"Date": 1}}, {"$limit": 1}, {"$project": {"Date": 1}}]), None)
+    if oldest is None or oldest["Date"] >= cutoff:
+        print("Nothing to archive.")
+        return
+    os.makedirs(archive_location, exist_ok=True)
+
+    for month in month_starts(oldest["Date"], cutoff):
+        date_range = {"$gte": month, "$lt": min(next_month(month), cutoff)}
+        pipeline = raw_pipeline(db, {"Date": date_range}) + [{"$project": {"_id": 0, **{f: 1 for f in RAW_FIELDS}}}]
+        cursor = db[RAW_COLLECTION].aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+
+        rows = 0
+
+        def counted(batches):
+            nonlocal rows
+            for df in batches:
+                rows += len(df)
+                yield df
+
+        path = os.path.join(archive_location, f"{RAW_COLLECTION}_{month:%Y_%m}_{datetime.now():%Y%m%d%H%M%S}.parquet")
+        with open(path + ".tmp", "wb") as f:
+            for chunk in stream_parquet(counted(iter_batches(cursor, RAW_FIELDS, batch_size)), RAW_FIELDS):
+                f.write(chunk)
+        if rows == 0:
+            os.remove(path + ".tmp")
+            continue
+        os.replace(path + ".tmp", path)
+
+        if delete:
+            try:
+                db[RAW_COLLECTION].delete_many({"Date": date_range})
+            except OperationFailure as e:
+                # Drop the file so a rerun does not archive these trials twice
+                os.remove(path)
+                print(f"Could not delete {month:%Y-%m} from {RAW_COLLECTION}, archive removed: {e}")
+                continue
+        print(f"Archived {rows} trials from {month:%Y-%m} to {path}")
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def synthetic_trials(num_trials, start, seed=0):
+    rng = np.random.default_rng(seed)
+    rats = rng.integers(1, 41, num_trials)
+    stages = rng.integers(0, 4, num_trials)
+    days = rng.integers(0, 730, num_trials)
+    latency = rng.random(num_trials) * 60
+    pokes = rng.integers(0, 10, num_trials)
+    for i in range(num_trials):
+        yield {
+            "Date": start + timedelta(days=int(days[i])),
+            "RatID": int(rats[i]), "Stage": int(stages[i]), "Session": int(days[i] % 50),
+            "Trial num": i % 40, "Latency to corr sample": float(latency[i]),
+            "Num pokes corr sample": float(pokes[i]), "TP": int(pokes[i] % 2), "FP": int(pokes[i] % 3),
+        }
+
+
+def benchmark(client, num_trials=10_000_000, batch_size=50_000):
+    """Load synthetic trials into each layout on a scratch database and time dashboard-style queries."""
+    start = datetime(2024, 8, 1)
+    queries = {
+        "one rat, one stage, 30 days": {"RatID": {"$in": [7]}, "Stage": {"$in": [2]},
+                                        "Date": {"$gte": datetime(2025, 3, 1), "$lte": datetime(2025, 3, 31)}},
+        "one stage, all rats, 90 days": {"Stage": {"$in": [2]},
+                                         "Date": {"$gte": datetime(2025, 1, 1), "$lte": datetime(2025, 3, 31)}},
+    }
+
+    for layout, indexed in (("flat", False), ("flat", True), ("timeseries", True)):
+        name = f"layout_benchmark_{layout}_{'indexed' if indexed else 'plain'}"
+        client.drop_database(name)
+        db = client[name]
+        create_raw_collection(db, layout)
+        if indexed:
+            for keys in TIMESERIES_INDEXES if raw_layout(db) == "timeseries" else FLAT_INDEXES:
+                db[RAW_COLLECTION].create_index(keys)
+
+        load_start = time.perf_counter()
+        batch = []
+        for trial in synthetic_trials(num_trials, start):
+            batch.append(trial)
+            if len(batch) >= batch_size:
+                insert_trials(db, batch)
+                batch = []
+        insert_trials(db, batch)
+        load_time = time.perf_counter() - load_start
+
+        stats = db.command("collStats", RAW_COLLECTION)
+        print(f"{raw_layout(db)} ({'indexed' if indexed else 'no indexes'}): "
+              f"{num_trials / load_time:.0f} trials/s insert, "
+              f"{stats['storageSize'] / 1024 ** 2:.0f} MB data, {stats['totalIndexSize'] / 1024 ** 2:.0f} MB indexes")
+        for label, query in queries.items():
+            query_start = time.perf_counter()
+            count = next(db[RAW_COLLECTION].aggregate(raw_pipeline(db, query) + [{"$count": "n"}]), {"n": 0})["n"]
+            print(f"  {label}: {count} trials in {(time.perf_counter() - query_start) * 1000:.0f} ms")
+        client.drop_database(name)
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from config import MONGO_URI
+
+    parser = argparse.ArgumentParser(description="Manage the Raw_Data storage layout.")
+    parser.add_argument("--migrate", action="store_true", help="Convert a flat Raw_Data into a time-series collection (stop the upload watcher first)")
+    parser.add_argument("--archive-before", type=datetime.fromisoformat, metavar="DATE",
+                        help="Move trials older than this date into the Parquet archive")
+    parser.add_argument("--keep", action="store_true", help="Archive without deleting from MongoDB")
+    parser.add_argument("--bench", type=int, metavar="TRIALS", help="Benchmark layouts with this many synthetic trials")
+    parser.add_argument("--uri", default=MONGO_URI, help="MongoDB to use, e.g. a local mongod for --bench")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    if args.bench:
+        benchmark(client, args.bench)
+    else:
+        db = client["training_data"]
+        ensure_layout(db)
+        if args.migrate:
+            migrate_to_timeseries(db)
+        if args.archive_before:
+            archive_before(db, args.archive_before, delete=not args.keep)
@@ -0,0 +1,136 @@
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ["Date", "RatID", "Stage"]
+COUNT_COLUMNS = ["TP_total", "FP_total", "S_FP_total", "M_FP_total", "trials_completed"]
+
+
+# -----------------------------
+# Compact Summary Frame
+# -----------------------------
+# The dashboard keeps one frame per worker: RatID as a category, Stage as int8,
+# daily counts as int32 and every other metric as float32, sorted by (Stage, RatID,
+# Date). Because rows for a stage are contiguous, page views are positional slices
+# of this frame instead of copies.
+def compact_summary(frame):
+    frame = frame.drop(columns=["_id"], errors="ignore")
+    frame["Date"] = pd.to_datetime(frame["Date"])
+    frame["RatID"] = frame["RatID"].astype("category")
+    frame["Stage"] = frame["Stage"].astype("int8")
+    counts = [col for col in COUNT_COLUMNS if col in frame.columns]
+    metrics = [col for col in frame.columns if col not in KEY_COLUMNS + COUNT_COLUMNS]
+    frame[counts] = frame[counts].fillna(0).astype("int32")
+    frame[metrics] = frame[metrics].astype("float32")
+    return frame.sort_values(["Stage", "RatID", "Date"], ignore_index=True)
+
+
+def stage_rows(frame, first_stage, last_stage=None):
+    """Slice out the rows for a stage (or inclusive range of stages) without copying."""
+    last_stage = first_stage if last_stage is None else last_stage
+    stages = frame["Stage"].to_numpy()
+    start = np.searchsorted(stages, first_stage, side="left")
+    stop = np.searchsorted(stages, last_stage, side="right")
+    return frame.iloc[start:stop]
+
+
+def select_rows(frame, stage, rat_ids):
+    rows = stage_rows(frame, stage)
+    if "all" in rat_ids:
+        return rows
+    return rows[rows["RatID"].isin(rat_ids)]
+
+
+def rat_values(frame):
+    """RatIDs present in the frame as plain ints for dropdown options."""
+    return [int(rat) for rat in frame["RatID"].unique().sort_values()]
+
+
+def table_records(frame):
+    # float32 values print with noise like 2.3499999046, so widen and round for display
+    metrics = frame.select_dtypes("float32").columns
+    table = frame.astype({col: "float64" for col in metrics}).round({col: 4 for col in metrics})
+    # Dates pre-formatted the way plotly's encoder would, so serializing skips per-row Timestamp handling
+    table["Date"] = table["Date"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    return table.to_dict("records")
+
+
+# -----------------------------
+# Memory and Latency Benchmark
+# -----------------------------
+def synthetic_summaries(num_rows, num_rats=40, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "Date": pd.Timestamp("2024-08-01") + pd.to_timedelta(rng.integers(0, 700, num_rows), unit="D"),
+        "RatID": rng.integers(1, num_rats + 1, num_rows),
+        "Stage": rng.integers(0, 4, num_rows),
+    })
+    for col in COUNT_COLUMNS:
+        frame[col] = rng.integers(0, 40, num_rows)
+    for col in ["Latency to corr sample_avg", "Latency to corr match_avg", "Num pokes corr sample_avg",
+                "Time in corr sample_avg", "Num pokes inc sample_avg", "Time in inc sample_avg",
+                "Num pokes corr match_avg", "Time in corr match_avg", "Max_HH"]:
+        frame[col] = rng.random(num_rows) * 20
+    return frame
+
+
+def records_bytes(frame):
+    """Python heap held by the table records for a frame, as the DataTable layout would keep them."""
+    tracemalloc.start()
+    records = table_records(frame)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def benchmark(num_rows=1_000_000, repeats=20, page_size=10):
+    raw = synthetic_summaries(num_rows)
+    mb = 1024 ** 2
+
+    # Previous layout: summary_df plus the df and progress_df copies, and every
+    # table row embedded in the page 1 layout as a list of dicts
+    summary_df = raw.copy()
+    df = summary_df[summary_df["Stage"] != 0].copy()
+    progress_df = summary_df.copy()
+    old_frames = sum(f.memory_usage(deep=True).sum() for f in (summary_df, df, progress_df))
+    old_table = records_bytes(compact_summary(df.copy()))
+
+    # Now: one compact frame, with the table paged on the server
+    compact = compact_summary(raw.copy())
+    pages = stage_rows(compact, 1, compact["Stage"].max())
+    new_frames = compact.memory_usage(deep=True).sum()
+    new_table = records_bytes(pages.iloc[:page_size])
+    shared = np.shares_memory(pages["Latency to corr sample_avg"].to_numpy(),
+                              compact["Latency to corr sample_avg"].to_numpy())
+
+    rats = [3, 7, 12]
+
+    def old_filter():
+        return df[(df["Stage"] == 2) & (df["RatID"].isin(rats))]
+
+    def new_filter():
+        return select_rows(compact, 2, rats)
+
+    timings = {}
+    for name, fn in (("old", old_filter), ("new", new_filter)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        timings[name] = (time.perf_counter() - start) / repeats * 1000
+
+    print(f"{num_rows} summary rows")
+    print(f"  frames per worker: {old_frames / mb:.1f} MB (3 copies) -> {new_frames / mb:.1f} MB (compact)")
+    print(f"  table data in layout: {old_table / mb:.1f} MB (all rows) -> {new_table / mb:.3f} MB (one page)")
+    print(f"  total per worker: {(old_frames + old_table) / mb:.1f} MB -> {(new_frames + new_table) / mb:.1f} MB")
+    print(f"  page view shares memory with compact frame: {shared}")
+    print(f"  stage + rat filter: {timings['old']:.2f} ms -> {timings['new']:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure dashboard frame memory and filter latency.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    benchmark(args.rows)
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+
+import pytest
+
+from video_uploads import BandwidthLimiter, LocalBackend, StorageBackend, Uploader
+
+CHUNK = 64 * 1024
+
+
+def make_video(path, size):
+    data = os.urandom(size)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data
+
+
+def make_uploader(tmp_path, backend=None, **kwargs):
+    kwargs.setdefault("chunk_size", CHUNK)
+    kwargs.setdefault("retry_delay", 0)
+    kwargs.setdefault("stable_interval", 0.01)
+    return Uploader(backend or LocalBackend(str(tmp_path / "dest")),
+                    checkpoint_path=str(tmp_path / "checkpoints.json"), **kwargs)
+
+
+class RecordingBackend(LocalBackend):
+    """LocalBackend that records every chunk offset it is sent."""
+
+    def __init__(self, dest_dir):
+        super().__init__(dest_dir)
+        self.offsets = []
+
+    def write_chunk(self, session, offset, data, size):
+        self.offsets.append(offset)
+        return super().write_chunk(session, offset, data, size)
+
+
+class FlakyBackend(LocalBackend):
+    """Fails on chosen write_chunk calls, like a connection dropping mid-upload."""
+
+    def __init__(self, dest_dir, fail_on):
+        super().__init__(dest_dir)
+        self.fail_on = set(fail_on)
+        self.calls = 0
+
+    def write_chunk(self, session, offset, data, size):
+        self.calls += 1
+        if self.calls in self.fail_on:
+            raise IOError("connection dropped")
+        return super().write_chunk(session, offset, data, size)
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_upload_is_sent_in_chunks(tmp_path):
+    src = tmp_path / "a.mp4"
+    data = make_video(src, 10 * CHUNK + 123)
+    backend = RecordingBackend(str(tmp_path / "dest"))
+    uploader = make_uploader(tmp_path, backend)
+
+    uploader.submit(str(src)).result()
+    uploader.shutdown()
+
+    assert backend.offsets == [i * CHUNK for i in range(11)]
+    assert (tmp_path / "dest" / "a.mp4").read_bytes() == data
+    assert not (tmp_path / "dest" / "a.mp4.part").exists()
+
+
+def test_stale_part_file_is_overwritten(tmp_path):
+    (tmp_path / "dest").mkdir()
+    (tmp_path / "dest" / "b.mp4.part").write_bytes(b"x" * (5 * CHUNK))
+    src = tmp_path / "b.mp4"
+    data = make_video(src, 3 * CHUNK)
+    uploader = make_uploader(tmp_path)
+
+    uploader.submit(str(src)).result()
+    uploader.shutdown()
+
+    assert (tmp_path / "dest" / "b.mp4").read_bytes() == data
+
+
+def test_resume_after_crash(tmp_path):
+    src = tmp_path / "c.mp4"
+    data = make_video(src, 6 * CHUNK + 7)
+    uploader = make_uploader(tmp_path, FlakyBackend(str(tmp_path / "dest"), fail_on={3}), max_retries=0)
+    with pytest.raises(IOError):
+        uploader.submit(str(src)).result()
+    uploader.shutdown()
+    assert not (tmp_path / "dest" / "c.mp4").exists()
+
+    # A new process picks up the checkpoint and only sends what is missing
+    backend = RecordingBackend(str(tmp_path / "dest"))
+    uploader = make_uploader(tmp_path, backend)
+    for future in uploader.resume_pending():
+        future.result()
+    uploader.shutdown()
+
+    assert backend.offsets[0] == 2 * CHUNK
+    assert (tmp_path / "dest" / "c.mp4").read_bytes() == data
+    assert uploader.checkpoints.pending() == []
+
+
+def test_transient_errors_are_retried(tmp_path):
+    src = tmp_path / "d.mp4"
+    data = make_video(src, 4 * CHUNK)
+    uploader = make_uploader(tmp_path, FlakyBackend(str(tmp_path / "dest"), fail_on={2, 3}), max_retries=3)
+
+    uploader.submit(str(src)).result()
+    uploader.shutdown()
+
+    assert (tmp_path / "dest" / "d.mp4").read_bytes() == data
+
+
+def test_partial_commit_is_resent(tmp_path):
+    class ShortBackend(LocalBackend):
+        # Keeps only half of every chunk, like Drive answering 308 with a short Range
+        def write_chunk(self, session, offset, data, size):
+            return super().write_chunk(session, offset, data[:max(1, len(data) // 2)], size)
+
+    src = tmp_path / "e.mp4"
+    data = make_video(src, 3 * CHUNK + 5)
+    uploader = make_uploader(tmp_path, ShortBackend(str(tmp_path / "dest")))
+
+    uploader.submit(str(src)).result()
+    uploader.shutdown()
+
+    assert (tmp_path / "dest" / "e.mp4").read_bytes() == data
+
+
+def test_file_growing_during_upload_is_restarted(tmp_path):
+    src = tmp_path / "f.mp4"
+    make_video(src, 4 * CHUNK)
+    extra = os.urandom(CHUNK)
+
+    class GrowingBackend(LocalBackend):
+        grown = False
+
+        def write_chunk(self, session, offset, data, size):
+            if not self.grown:
+                self.grown = True
+                with open(src, "ab") as f:
+                    f.write(extra)
+            return super().write_chunk(session, offset, data, size)
+
+    uploader = make_uploader(tmp_path, GrowingBackend(str(tmp_path / "dest")))
+    uploader.submit(str(src)).result()
+    uploader.shutdown()
+
+    assert (tmp_path / "dest" / "f.mp4").read_bytes() == src.read_bytes()
+
+
+def test_concurrent_uploads_and_sweep(tmp_path):
+    class SlowBackend(LocalBackend):
+        def __init__(self, dest_dir):
+            super().__init__(dest_dir)
+            self.active = 0
+            self.peak = 0
+            self.lock = threading.Lock()
+
+        def write_chunk(self, session, offset, data, size):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.02)
+            with self.lock:
+                self.active -= 1
+            return super().write_chunk(session, offset, data, size)
+
+    folder = tmp_path / "videos"
+    folder.mkdir()
+    videos = {f"v{i}.mp4": make_video(folder / f"v{i}.mp4", 3 * CHUNK) for i in range(4)}
+    (folder / "notes.txt").write_text("not a video")
+    backend = SlowBackend(str(tmp_path / "dest"))
+    uploader = make_uploader(tmp_path, backend, max_workers=4)
+
+    for future in uploader.sweep(str(folder)):
+        future.result()
+    # Already archived and unchanged, so a second sweep queues nothing
+    assert uploader.sweep(str(folder)) == []
+    uploader.shutdown()
+
+    assert backend.peak > 1
+    for name, data in videos.items():
+        assert (tmp_path / "dest" / name).read_bytes() == data
+    assert not (tmp_path / "dest" / "notes.txt").exists()
+
+
+def test_bandwidth_limiter():
+    limiter = BandwidthLimiter(1_000_000)
+    start = time.monotonic()
+    for _ in range(8):
+        limiter.consume(250_000)
+    # The first second's worth goes out as a burst, the rest is paced
+    assert time.monotonic() - start >= 0.9
+
+    unlimited = BandwidthLimiter(None)
+    start = time.monotonic()
+    unlimited.consume(10 ** 12)
+    assert time.monotonic() - start < 0.1
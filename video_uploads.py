@@ -1,32 +1,480 @@
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from pydrive.auth import GoogleAuth
-from pydrive.drive import GoogleDrive
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+import threading
+import argparse
+import tempfile
+import shutil
+import json
 import os
-import time 
+import time
 
 folderLocation = r"C:\Users\\Pictures\Camera Roll"
+CREDENTIALS_FILE = "mycreds.txt"
+CHECKPOINT_FILE = "upload_checkpoints.json"
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".h264")
 
-#Authenticating
-gauth = GoogleAuth()
-gauth.LoadCredentialsFile("mycreds.txt")
+# Drive resumable uploads require chunks in multiples of 256 KiB
+CHUNK_SIZE = 32 * 256 * 1024
+MAX_WORKERS = 3
+# Bytes per second shared across all uploads, None for unlimited
+BANDWIDTH_LIMIT = None
+# Failed uploads are retried with exponential backoff starting at RETRY_DELAY seconds
+MAX_RETRIES = 5
+RETRY_DELAY = 5
 
-if gauth.credentials is None:
-    gauth.LocalWebserverAuth()
-elif gauth.access_token_expired:
-    gauth.Refresh()
-else:
-    gauth.Authorize()
+#look into www.blomp.com for storage of videos
 
-gauth.SaveCredentialsFile("mycreds.txt")    
 
-GoogleDrive = GoogleDrive(gauth)    
+# -----------------------------
+# Storage Backends
+# -----------------------------
+# A backend turns an upload into three steps: start() returns a JSON-serializable
+# session that is saved in the checkpoint file, write_chunk() sends bytes at an
+# offset and returns how far the backend has actually stored, and finish() commits
+# the file. committed() asks the backend how many bytes it holds so an interrupted
+# upload resumes from the right place.
+class StorageBackend(ABC):
+    @abstractmethod
+    def start(self, name, size):
+        pass
 
-#look into www.blomp.com for storage of videos
+    @abstractmethod
+    def committed(self, session):
+        pass
+
+    @abstractmethod
+    def write_chunk(self, session, offset, data, size):
+        pass
+
+    @abstractmethod
+    def finish(self, session):
+        pass
+
+
+class LocalBackend(StorageBackend):
+    """Copies files into a local folder. Stands in for Drive when testing."""
+
+    def __init__(self, dest_dir):
+        self.dest_dir = dest_dir
+        os.makedirs(dest_dir, exist_ok=True)
+
+    def start(self, name, size):
+        part_path = os.path.join(self.dest_dir, name + ".part")
+        # A new session always starts from an empty part file, never a leftover one
+        open(part_path, "wb").close()
+        return {"part_path": part_path, "final_path": os.path.join(self.dest_dir, name), "size": size}
+
+    def committed(self, session):
+        if not os.path.exists(session["part_path"]):
+            raise IOError(f"Part file {session['part_path']} is missing")
+        return os.path.getsize(session["part_path"])
+
+    def write_chunk(self, session, offset, data, size):
+        with open(session["part_path"], "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+        return offset + len(data)
+
+    def finish(self, session):
+        stored = self.committed(session)
+        if stored != session["size"]:
+            raise IOError(f"{session['part_path']} has {stored} of {session['size']} bytes")
+        os.replace(session["part_path"], session["final_path"])
+
+
+def authenticate():
+    from pydrive.auth import GoogleAuth
+
+    gauth = GoogleAuth()
+    gauth.LoadCredentialsFile(CREDENTIALS_FILE)
+
+    if gauth.credentials is None:
+        gauth.LocalWebserverAuth()
+    elif gauth.access_token_expired:
+        gauth.Refresh()
+    else:
+        gauth.Authorize()
+
+    gauth.SaveCredentialsFile(CREDENTIALS_FILE)
+    return gauth
+
+
+class DriveBackend(StorageBackend):
+    """Uploads to Google Drive using the resumable upload protocol."""
+
+    UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable"
+
+    def __init__(self, folder_id=None):
+        self.gauth = authenticate()
+        self.folder_id = folder_id
+        # httplib2 connections are not thread safe, so each worker gets its own
+        self._local = threading.local()
+
+    def _http(self):
+        if not hasattr(self._local, "http"):
+            import httplib2
+            self._local.http = self.gauth.credentials.authorize(httplib2.Http())
+        return self._local.http
+
+    def _stored(self, resp, session):
+        """Bytes Drive has stored according to a 200/201/308 response."""
+        if resp.status in (200, 201):
+            return session["size"]
+        # Range header looks like "bytes=0-1234", absent if nothing was received
+        received = resp.get("range")
+        return int(received.split("-")[1]) + 1 if received else 0
+
+    def start(self, name, size):
+        metadata = {"name": name}
+        if self.folder_id:
+            metadata["parents"] = [self.folder_id]
+        resp, content = self._http().request(
+            self.UPLOAD_URL, "POST", body=json.dumps(metadata),
+            headers={"Content-Type": "application/json; charset=UTF-8",
+                     "X-Upload-Content-Length": str(size)})
+        if resp.status != 200:
+            raise IOError(f"Drive refused upload session for {name}: {resp.status} {content}")
+        return {"uri": resp["location"], "size": size}
+
+    def committed(self, session):
+        resp, _ = self._http().request(
+            session["uri"], "PUT", body=b"",
+            headers={"Content-Range": f"bytes */{session['size']}", "Content-Length": "0"})
+        if resp.status not in (200, 201, 308):
+            raise IOError(f"Drive upload session expired: {resp.status}")
+        return self._stored(resp, session)
+
+    def write_chunk(self, session, offset, data, size):
+        end = offset + len(data) - 1
+        resp, content = self._http().request(
+            session["uri"], "PUT", body=data,
+            headers={"Content-Range": f"bytes {offset}-{end}/{size}", "Content-Length": str(len(data))})
+        if resp.status not in (200, 201, 308):
+            raise IOError(f"Drive chunk upload failed: {resp.status} {content}")
+        # Drive may keep less than it was sent, the uploader carries on from here
+        return self._stored(resp, session)
+
+    def finish(self, session):
+        # The final chunk completes the upload on Drive's side, make sure it did
+        stored = self.committed(session)
+        if stored != session["size"]:
+            raise IOError(f"Drive has {stored} of {session['size']} bytes")
+
+
+# -----------------------------
+# Checkpoints and Bandwidth
+# -----------------------------
+class CheckpointStore:
+    """Saves upload progress to a JSON file so a restart picks up where it left off.
+
+    Finished uploads are remembered by size and mtime so the startup sweep and
+    modify events do not archive the same video twice.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.checkpoints = {}
+        self.completed = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.checkpoints = saved.get("pending", {})
+            self.completed = saved.get("completed", {})
+
+    def get(self, file_path):
+        with self.lock:
+            return self.checkpoints.get(file_path)
+
+    def pending(self):
+        with self.lock:
+            return list(self.checkpoints)
+
+    def save(self, file_path, checkpoint):
+        with self.lock:
+            self.checkpoints[file_path] = checkpoint
+            self._flush()
+
+    def remove(self, file_path):
+        with self.lock:
+            self.checkpoints.pop(file_path, None)
+            self._flush()
+
+    def mark_completed(self, file_path, size, mtime):
+        with self.lock:
+            self.checkpoints.pop(file_path, None)
+            self.completed[file_path] = {"size": size, "mtime": mtime}
+            self._flush()
+
+    def is_completed(self, file_path, size, mtime):
+        with self.lock:
+            return self.completed.get(file_path) == {"size": size, "mtime": mtime}
+
+    def _flush(self):
+        # Write to a temp file first so a crash never leaves a half written checkpoint file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pending": self.checkpoints, "completed": self.completed}, f)
+        os.replace(tmp_path, self.path)
+
+
+class BandwidthLimiter:
+    """Token bucket shared by every upload thread."""
+
+    def __init__(self, bytes_per_sec):
+        self.rate = bytes_per_sec
+        self.tokens = bytes_per_sec
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, num_bytes):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                # Chunks bigger than the bucket are let through once it is full
+                if self.tokens >= min(num_bytes, self.rate):
+                    self.tokens -= num_bytes
+                    return
+                wait = (min(num_bytes, self.rate) - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# -----------------------------
+# Uploader
+# -----------------------------
+class FileChangedError(Exception):
+    """The source file changed while it was being uploaded."""
+
+
+# Cameras keep writing to a file after it is created, so wait for the size to settle
+def wait_until_stable(file_path, interval=2, checks=3):
+    last_size, stable = -1, 0
+    while stable < checks:
+        if not os.path.exists(file_path):
+            return False
+        size = os.path.getsize(file_path)
+        stable = stable + 1 if size == last_size else 0
+        last_size = size
+        time.sleep(interval)
+    return True
+
+
+class Uploader:
+    def __init__(self, backend, checkpoint_path=CHECKPOINT_FILE, chunk_size=CHUNK_SIZE,
+                 max_workers=MAX_WORKERS, bandwidth_limit=BANDWIDTH_LIMIT,
+                 max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, stable_interval=2):
+        self.backend = backend
+        self.checkpoints = CheckpointStore(checkpoint_path)
+        self.chunk_size = chunk_size
+        self.limiter = BandwidthLimiter(bandwidth_limit)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.stable_interval = stable_interval
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def submit(self, file_path):
+        # Missing files still go through so upload() can drop their checkpoint
+        if os.path.exists(file_path) and self.checkpoints.is_completed(
+                file_path, os.path.getsize(file_path), os.path.getmtime(file_path)):
+            return None
+        with self.lock:
+            if file_path in self.in_flight:
+                return None
+            self.in_flight.add(file_path)
+        return self.executor.submit(self._run, file_path)
+
+    def resume_pending(self):
+        """Restart any uploads that were cut off by the last shutdown."""
+        return [self.submit(file_path) for file_path in self.checkpoints.pending()]
+
+    def sweep(self, folder_location):
+        """Queue every video in the folder that has not been archived yet."""
+        futures = []
+        for entry in os.scandir(folder_location):
+            if entry.is_file() and entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                futures.append(self.submit(entry.path))
+        return [future for future in futures if future is not None]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def _run(self, file_path):
+        attempt = 0
+        try:
+            while True:
+                try:
+                    self.upload(file_path)
+                    return
+                except FileChangedError:
+                    print(f"{file_path} changed during upload, restarting once it settles.")
+                    if not wait_until_stable(file_path, interval=self.stable_interval):
+                        return
+                except (IOError, OSError) as e:
+                    if attempt >= self.max_retries:
+                        print(f"Error uploading {file_path}: {e}")
+                        raise
+                    # The checkpoint is kept, so the retry resumes from what the backend committed
+                    delay = self.retry_delay * 2 ** attempt
+                    attempt += 1
+                    print(f"Error uploading {file_path}: {e}, retrying in {delay}s ({attempt}/{self.max_retries}).")
+                    time.sleep(delay)
+        finally:
+            with self.lock:
+                self.in_flight.discard(file_path)
+
+    def upload(self, file_path):
+        if not os.path.exists(file_path):
+            print(f"Skipping {file_path}, file no longer exists.")
+            self.checkpoints.remove(file_path)
+            return
+
+        size = os.path.getsize(file_path)
+        mtime = os.path.getmtime(file_path)
+        checkpoint = self.checkpoints.get(file_path)
+
+        # Only resume if the file is unchanged since the checkpoint was written
+        if checkpoint and checkpoint["size"] == size and checkpoint["mtime"] == mtime:
+            session = checkpoint["session"]
+            try:
+                offset = self.backend.committed(session)
+                print(f"Resuming {file_path} at {offset / size:.0%}.")
+            except IOError:
+                checkpoint = None
+        else:
+            checkpoint = None
+
+        if checkpoint is None:
+            session = self.backend.start(os.path.basename(file_path), size)
+            offset = 0
+            self.checkpoints.save(file_path, {"session": session, "size": size, "mtime": mtime, "offset": 0})
+
+        with open(file_path, "rb") as f:
+            while offset < size:
+                f.seek(offset)
+                data = f.read(self.chunk_size)
+                if not data:
+                    raise FileChangedError(file_path)
+                self.limiter.consume(len(data))
+                offset = self.backend.write_chunk(session, offset, data, size)
+                self.checkpoints.save(file_path, {"session": session, "size": size, "mtime": mtime, "offset": offset})
+
+        # A recording that kept growing after the stability check must not be archived truncated
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != size or os.path.getmtime(file_path) != mtime:
+            self.checkpoints.remove(file_path)
+            raise FileChangedError(file_path)
+
+        self.backend.finish(session)
+        self.checkpoints.mark_completed(file_path, size, mtime)
+        print(f"Uploaded {file_path}.")
+
+
+# Watchdog to monitor folder
+def watch_and_upload(uploader, folder_location=folderLocation):
+    class VideoWatcher(FileSystemEventHandler):
+        def __init__(self):
+            self.waiting = set()
+            self.lock = threading.Lock()
+
+        def on_created(self, event):
+            self.schedule(event.src_path)
+
+        # Modify events also catch recordings that keep growing after an upload started or finished
+        def on_modified(self, event):
+            self.schedule(event.src_path)
+
+        def on_moved(self, event):
+            self.schedule(event.dest_path)
+
+        def schedule(self, file_path):
+            if not file_path.lower().endswith(VIDEO_EXTENSIONS) or os.path.isdir(file_path):
+                return
+            with self.lock:
+                if file_path in self.waiting:
+                    return
+                self.waiting.add(file_path)
+            print(f"Video changed: {file_path}")
+            threading.Thread(target=self.upload_when_ready, args=(file_path,), daemon=True).start()
+
+        def upload_when_ready(self, file_path):
+            try:
+                if wait_until_stable(file_path, interval=uploader.stable_interval):
+                    uploader.submit(file_path)
+            finally:
+                with self.lock:
+                    self.waiting.discard(file_path)
+
+    # Same as mongo_upload: catch up on anything recorded while we were down, then watch
+    uploader.resume_pending()
+    uploader.sweep(folder_location)
+
+    observer = Observer()
+    observer.schedule(VideoWatcher(), path=folder_location, recursive=False)
+    observer.start()
+    print(f"Watching folder: {folder_location}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        observer.stop()
+        print("Stopping video watcher...")
+    observer.join()
+    uploader.shutdown()
+
+
+# -----------------------------
+# Throughput Benchmark
+# -----------------------------
+def benchmark(size_gb=2, num_files=3, max_workers=MAX_WORKERS, chunk_size=CHUNK_SIZE):
+    """Upload several multi-GB files through LocalBackend and report throughput."""
+    work_dir = tempfile.mkdtemp(prefix="video_bench_")
+    try:
+        src_dir = os.path.join(work_dir, "src")
+        os.makedirs(src_dir)
+        block = os.urandom(chunk_size)
+        paths = []
+        for i in range(num_files):
+            path = os.path.join(src_dir, f"bench_{i}.mp4")
+            with open(path, "wb") as f:
+                for _ in range(int(size_gb * 1024 ** 3) // chunk_size):
+                    f.write(block)
+            paths.append(path)
+
+        uploader = Uploader(LocalBackend(os.path.join(work_dir, "dest")),
+                            checkpoint_path=os.path.join(work_dir, CHECKPOINT_FILE),
+                            chunk_size=chunk_size, max_workers=max_workers)
+        total = sum(os.path.getsize(p) for p in paths)
+        start = time.perf_counter()
+        for future in [uploader.submit(p) for p in paths]:
+            future.result()
+        elapsed = time.perf_counter() - start
+        uploader.shutdown()
+        print(f"Uploaded {num_files} x {size_gb} GB with {max_workers} workers in {elapsed:.1f}s "
+              f"({total / elapsed / 1024 ** 2:.0f} MB/s)")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive rig videos to Google Drive.")
+    parser.add_argument("--local", help="Copy to this folder instead of Google Drive")
+    parser.add_argument("--folder-id", help="Drive folder to upload into")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--limit-mbps", type=float, help="Bandwidth cap in megabytes per second")
+    parser.add_argument("--bench", type=float, metavar="GB", help="Run the throughput benchmark with files of this size")
+    args = parser.parse_args()
 
-def upload(file_path):
-    file_name = GoogleDrive.CreateFile({'title': file_name})
-    gfile.SetContentFile(file_path)
-    gfile.Upload()
-    print(f"Uploaded {file_path} to Google Drive.")
-    
+    if args.bench:
+        benchmark(size_gb=args.bench, max_workers=args.workers)
+    else:
+        backend = LocalBackend(args.local) if args.local else DriveBackend(args.folder_id)
+        limit = int(args.limit_mbps * 1024 ** 2) if args.limit_mbps else BANDWIDTH_LIMIT
+        watch_and_upload(Uploader(backend, max_workers=args.workers, bandwidth_limit=limit))